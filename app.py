@@ -1,28 +1,23 @@
-import gradio as gr
 from main import initialize_agent
+import asyncio
 import os
 import logging
 import shutil
+import string
+import uuid
+from logging_setup import configure as configure_logging
 
-# Configure logging for the Gradio app
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("app.log"),
-                        logging.StreamHandler()
-                    ])
+# Configure logging for the Gradio app (shared queued setup; no-op if main.py already did it)
+configure_logging()
 logger = logging.getLogger(__name__) # Use a logger specific to this module (app)
 
 UPLOADS_DIR = "uploads" # Directory to store uploaded files
-
-# Attempt to initialize the agent
-logger.info("Gradio app attempting to initialize AI Agent...")
-agent = initialize_agent() # Use the new initializer from main.py
-
-if agent:
-    logger.info("AI Agent initialized successfully for Gradio app.")
-else:
-    logger.error("AI Agent failed to initialize. Gradio app might not function correctly.")
+UPLOAD_COPY_CHUNK_SIZE = 1024 * 1024 # 1 MiB buffer when an upload has to be copied
+# Translation table deleting every ASCII character that isn't allowed in saved upload filenames
+_ALLOWED_FILENAME_CHARS = set(string.ascii_letters + string.digits + "._-")
+_SANITIZE_FILENAME = str.maketrans("", "", "".join(chr(c) for c in range(128) if chr(c) not in _ALLOWED_FILENAME_CHARS))
+QUEUE_CONCURRENCY_LIMIT = 8 # Requests handled at once; more are cheap since the LLM call is awaited
+QUEUE_MAX_SIZE = 64 # Pending requests beyond this are rejected instead of queueing without bound
 
 # Ensure uploads directory exists
 if not os.path.exists(UPLOADS_DIR):
@@ -32,7 +27,29 @@ if not os.path.exists(UPLOADS_DIR):
     except Exception as e:
         logger.error(f"Failed to create directory {UPLOADS_DIR}: {e}", exc_info=True)
 
-def agent_chat_interface(message: str, history: list, uploaded_file_obj=None):
+def _store_upload(src_path: str, dest_path: str) -> None:
+    """Places an uploaded file in UPLOADS_DIR, avoiding a full copy when possible."""
+    try:
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        # Same filesystem: hard-link so no file data is copied, and Gradio's temp file stays valid
+        # (the file input persists between chat messages and may be submitted again)
+        os.link(src_path, dest_path)
+    except OSError:
+        # Different filesystem or links unsupported: stream in fixed-size chunks to keep memory flat
+        with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+            shutil.copyfileobj(src, dest, UPLOAD_COPY_CHUNK_SIZE)
+
+def _remove_upload(dest_path: str) -> None:
+    """Deletes a saved upload (or a partial copy of one), logging rather than raising on failure."""
+    try:
+        os.unlink(dest_path)
+    except FileNotFoundError:
+        pass # Storing failed before the file was created
+    except OSError as e:
+        logger.warning(f"Failed to remove uploaded file {dest_path}: {e}")
+
+async def agent_chat_interface(agent, message: str, history: list, uploaded_file_obj=None):
     logger.info(f"Gradio ChatInterface input. Message: '{message}', History: {history}, File: {uploaded_file_obj}")
 
     if agent is None:
@@ -42,16 +59,20 @@ def agent_chat_interface(message: str, history: list, uploaded_file_obj=None):
         return "Error: Agent not initialized. Check logs."
 
     processed_input = message.strip() if message else ""
-    
+    destination_path = None # Saved upload, removed once the agent has answered
+
     if uploaded_file_obj:
         try:
-            temp_file_path = uploaded_file_obj.name # .name gives the temp path for gr.File
+            # gr.File(type="filepath") passes a str path; older Gradio versions pass a tempfile wrapper with .name
+            temp_file_path = getattr(uploaded_file_obj, "name", uploaded_file_obj)
             original_filename = os.path.basename(temp_file_path) 
-            safe_filename = "".join(c for c in original_filename if c.isalnum() or c in ('.', '_', '-')).strip()
-            if not safe_filename: safe_filename = "uploaded_file"
+            # Non-ASCII characters are dropped by the encode, disallowed ASCII ones by the table
+            ascii_filename = original_filename.encode("ascii", "ignore").decode("ascii")
+            safe_filename = ascii_filename.translate(_SANITIZE_FILENAME).strip() or "uploaded_file"
             
-            destination_path = os.path.join(UPLOADS_DIR, safe_filename)
-            shutil.copy(temp_file_path, destination_path)
+            # Unique per request, so concurrent uploads of the same name don't clobber or delete each other
+            destination_path = os.path.join(UPLOADS_DIR, f"{uuid.uuid4().hex[:8]}_{safe_filename}")
+            await asyncio.to_thread(_store_upload, temp_file_path, destination_path)
             logger.info(f"File uploaded and saved to: {destination_path}")
             
             upload_info = f"(User uploaded file '{safe_filename}' to path '{destination_path}')"
@@ -63,7 +84,9 @@ def agent_chat_interface(message: str, history: list, uploaded_file_obj=None):
             logger.info(f"Input to agent after file processing: {processed_input}")
 
         except Exception as e:
-            logger.error(f"Error processing uploaded file '{uploaded_file_obj.name if uploaded_file_obj else 'N/A'}': {e}", exc_info=True)
+            logger.error(f"Error processing uploaded file '{getattr(uploaded_file_obj, 'name', uploaded_file_obj) or 'N/A'}': {e}", exc_info=True)
+            if destination_path:
+                _remove_upload(destination_path) # Don't leave a partially copied file behind
             return f"Error processing uploaded file: {str(e)}"
 
     if not processed_input: 
@@ -74,37 +97,56 @@ def agent_chat_interface(message: str, history: list, uploaded_file_obj=None):
         # The agent.process_request expects a single string input.
         # We don't use 'history' directly for the agent call here, as our agent is stateless per request.
         # The ChatInterface itself will manage displaying the history.
-        response = agent.process_request(processed_input)
+        response = await agent.process_request_async(processed_input)
         logger.info(f"Agent response (first 100 chars): {str(response)[:100]}")
         return str(response)
     except Exception as e:
         logger.error(f"Error in agent.process_request: {e}", exc_info=True)
         return f"Sorry, an internal error occurred: {str(e)}"
+    finally:
+        # Requests mentioning uploads are never cached, and Gradio re-sends the file with each
+        # message, so the saved copy can go; this keeps UPLOADS_DIR from growing without bound
+        if destination_path:
+            _remove_upload(destination_path)
+
+def build_chat_ui(agent):
+    """Builds the Gradio ChatInterface around an initialized agent."""
+    import gradio as gr # Imported here so importing this module doesn't load Gradio
+
+    async def chat_fn(message: str, history: list, uploaded_file_obj=None):
+        return await agent_chat_interface(agent, message, history, uploaded_file_obj)
 
-# Using gr.ChatInterface
-chat_ui = gr.ChatInterface(
-    fn=agent_chat_interface,
-    title="<img src='file/opsera_logo.png' alt='Opsera Logo' style='height:40px; margin-right:10px;'>AI Agent (Chat UI)",
-    description=("Interact with the AI agent. Upload files using the button below the textbox. "
-                 "The agent can use tools like a calculator, weather fetcher, and file reader."),
-    additional_inputs=[
-        gr.File(label="Upload File (Optional)", type="filepath")
-    ],
-    # examples are structured differently for ChatInterface, typically as a list of messages for history
-    # For simplicity with file uploads, we might omit direct examples here or provide text-only ones.
-    examples=[
-        ["What is 15 * 24 / 3?"],
-        ["What's the weather in New York?"],
-        ["Read the README.md file"] # User would need to place README.md for agent to find or upload it.
-    ],
-    theme=gr.themes.Default(neutral_hue=gr.themes.colors.slate),
-    # For Gradio 4.19.1, use allow_flagging. If you upgrade Gradio, switch to flagging_options.
-    # allow_flagging="never" # Removing this as it might cause issues with newer Gradio versions
-)
+    # Using gr.ChatInterface
+    return gr.ChatInterface(
+        fn=chat_fn,
+        title="<img src='file/opsera_logo.png' alt='Opsera Logo' style='height:40px; margin-right:10px;'>AI Agent (Chat UI)",
+        description=("Interact with the AI agent. Upload files using the button below the textbox. "
+                     "The agent can use tools like a calculator, weather fetcher, and file reader."),
+        additional_inputs=[
+            gr.File(label="Upload File (Optional)", type="filepath")
+        ],
+        # examples are structured differently for ChatInterface, typically as a list of messages for history
+        # For simplicity with file uploads, we might omit direct examples here or provide text-only ones.
+        examples=[
+            ["What is 15 * 24 / 3?"],
+            ["What's the weather in New York?"],
+            ["Read the README.md file"] # User would need to place README.md for agent to find or upload it.
+        ],
+        theme=gr.themes.Default(neutral_hue=gr.themes.colors.slate),
+        # For Gradio 4.19.1, use allow_flagging. If you upgrade Gradio, switch to flagging_options.
+        # allow_flagging="never" # Removing this as it might cause issues with newer Gradio versions
+    )
 
 if __name__ == "__main__":
+    # Attempt to initialize the agent
+    logger.info("Gradio app attempting to initialize AI Agent...")
+    agent = initialize_agent() # Use the new initializer from main.py
     if agent is not None:
+        logger.info("AI Agent initialized successfully for Gradio app.")
+        chat_ui = build_chat_ui(agent)
         logger.info("Starting Gradio ChatInterface...")
+        # Gradio 4+ replaced queue(concurrency_count=...) with default_concurrency_limit
+        chat_ui.queue(default_concurrency_limit=QUEUE_CONCURRENCY_LIMIT, max_size=QUEUE_MAX_SIZE)
         chat_ui.launch()
     else:
         logger.error("Agent not initialized. Gradio interface will not start.")
@@ -6,11 +6,16 @@ load_dotenv()  # Load environment variables from .env file
 """Configuration settings for the AI agent."""
 
 # LLM settings
-# Ensure TOGETHER_API_KEY is loaded and available.
-# The Together client in main.py will automatically pick up TOGETHER_API_KEY from the environment.
+# .env is loaded exactly once, above; other modules read the key from here instead of re-loading.
+TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 # You can set a default model here if you wish.
 TOGETHER_MODEL = os.getenv("TOGETHER_MODEL", "mistralai/Mixtral-8x7B-Instruct-v0.1")
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.7))
+# Tool selection should be deterministic, so it uses its own temperature (LLM_TEMPERATURE is for answer generation)
+TOOL_SELECTION_TEMPERATURE = float(os.getenv("TOOL_SELECTION_TEMPERATURE", 0.0))
+# Connection pool for async Together API calls (connections are kept alive and reused between requests)
+TOGETHER_MAX_CONNECTIONS = int(os.getenv("TOGETHER_MAX_CONNECTIONS", 32))
+TOGETHER_KEEPALIVE_SECONDS = float(os.getenv("TOGETHER_KEEPALIVE_SECONDS", 30))
 
 # Weather API Key (Example for a tool that might need a specific key)
 # The WeatherFetcherTool itself should handle the API key logic (e.g., read from env).
@@ -18,6 +23,17 @@ LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.7))
 # WEATHER_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
 
 
+# Exact-match response cache (number of distinct requests kept; 0 disables caching)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 512))
+
+# Semantic cache for tool selection (optional; needs `pip install sqlite-vec sentence-transformers`).
+# Near-duplicate requests reuse a previous tool/parameter choice instead of calling the LLM.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_DB = os.getenv("SEMANTIC_CACHE_DB", "semantic_cache.db")
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", 0.1)) # Cosine distance; lower is stricter
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+
 # Generic Tool settings (if any)
 # MAX_FILE_READ_SIZE = 4096 # Example
 
@@ -26,5 +42,5 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 LOG_FILE = "agent.log"
 
 print(f"Config loaded: Model={TOGETHER_MODEL}, Temp={LLM_TEMPERATURE}, LogLevel={LOG_LEVEL}")
-if not os.getenv("TOGETHER_API_KEY"):
+if not TOGETHER_API_KEY:
     print("Warning: TOGETHER_API_KEY not found in .env file or environment variables. AI agent will not work.")
\ No newline at end of file
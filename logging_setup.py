@@ -0,0 +1,88 @@
+"""Centralized logging setup shared by the CLI (main.py) and the Gradio app (app.py)."""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+
+import config
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_QUEUE_MAXSIZE = 10000
+LOG_FILE_BUFFER_CAPACITY = 512 # Records buffered before the log file is written; ERROR and above flush immediately
+DUPLICATE_LOG_WINDOW_SECONDS = 5.0 # Identical file log records within this window are dropped
+
+_listener = None # The single background QueueListener, started on first configure()
+_file_buffer = None # MemoryHandler batching writes to the log file
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of erroring when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass # Never block or spam stderr on the request thread; losing a log line is acceptable
+
+
+class DuplicateFilter(logging.Filter):
+    """Drops a record if an identical one (same level and message) passed within the last `window` seconds.
+
+    Bounds log file volume when an error repeats in a tight loop (e.g. the LLM keeps returning malformed JSON).
+    """
+
+    def __init__(self, window: float = DUPLICATE_LOG_WINDOW_SECONDS, max_tracked: int = 1024):
+        super().__init__()
+        self.window = window
+        self.max_tracked = max_tracked
+        self._last = {} # (levelno, message) -> monotonic time it was last let through
+
+    def filter(self, record):
+        now = time.monotonic()
+        key = (record.levelno, record.getMessage())
+        last = self._last.get(key)
+        if last is not None and now - last < self.window:
+            return False
+        self._last[key] = now
+        if len(self._last) > self.max_tracked:
+            # Forget entries whose window has passed so the map can't grow without bound
+            self._last = {k: t for k, t in self._last.items() if now - t < self.window}
+        return True
+
+
+def configure():
+    """Route all logging through a queue so request threads never block on file/stream I/O.
+
+    The real FileHandler and StreamHandler are owned by a background QueueListener thread.
+    Safe to call more than once; only the first call has any effect.
+    """
+    global _listener, _file_buffer
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(config.LOG_FILE)
+    file_handler.setFormatter(formatter)
+    # Batch file writes so the listener thread issues one write per buffer instead of one per record
+    _file_buffer = logging.handlers.MemoryHandler(LOG_FILE_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler)
+    # Only the file is de-duplicated; the console still shows every record
+    _file_buffer.addFilter(DuplicateFilter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(getattr(logging, config.LOG_LEVEL, logging.INFO))
+    root_logger.addHandler(_NonBlockingQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, _file_buffer, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_shutdown)
+
+
+def _shutdown():
+    """Drain the queue, then write out any buffered file records."""
+    _listener.stop()
+    _file_buffer.flush()
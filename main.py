@@ -1,53 +1,131 @@
-import os
-from typing import List, Dict, Any, Optional
-from together import Together
-from dotenv import load_dotenv
-from tools.calculator import CalculatorTool
-# from tools.opsera_search import OpseraSearchTool # Removed
-from tools.file_reader import FileReaderTool
-from tools.weather_fetcher import WeatherFetcherTool
-import config # Use our simplified config
+import config # Use our simplified config; imported first so .env is loaded before anything reads the environment
+import asyncio
+import atexit
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 import logging
-import inspect # Keep for debugging if needed
+import inspect # Used to record each tool's expected parameters
 import json # ensure json is imported for response parsing
+try:
+    import orjson # Faster JSON parsing for LLM responses; its JSONDecodeError subclasses json.JSONDecodeError
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 import re # ensure re is imported for response parsing
+from logging_setup import configure as configure_logging
+from semantic_cache import SemanticToolCache, SEMANTIC_CACHE_AVAILABLE
 
 
-# Configure logging using values from config.py
-logging.basicConfig(level=getattr(logging, config.LOG_LEVEL, logging.INFO),
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler(config.LOG_FILE),
-                        logging.StreamHandler()
-                    ])
+# Configure logging using values from config.py (queued, so request threads don't block on log I/O)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Print Together Client path for debugging, right after imports
 # logger.info(f"together.Together path: {inspect.getfile(Together)}") # This might be too verbose for normal runs
 
+# Matches from the first '{' to the last '}' so nested parameter objects are captured whole
+_JSON_BLOCK_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+def _calculator_parameters(match: "re.Match") -> Optional[Dict[str, Any]]:
+    expression = match.group("expr").strip()
+    return {"expression": expression} if any(c.isdigit() for c in expression) else None
+
+def _file_reader_parameters(match: "re.Match") -> Optional[Dict[str, Any]]:
+    path = match.group("path")
+    # Only paths with an extension or directory part, so "read notes file" still goes to the LLM
+    return {"file_path": path} if ("." in path or "/" in path) else None
+
+# Requests that can be routed to a tool without asking the LLM: (pattern, tool name, parameter builder).
+# Patterns are fullmatched against the stripped request, so anything with extra wording still goes to the LLM.
+# No two quantified parts of a pattern can match the same characters, so matching stays linear on any input;
+# the builders do the remaining checks and return None to reject a match.
+_PREFILTERS = [
+    # Bare arithmetic, optionally phrased as "what is ...?" / "calculate ..."
+    (re.compile(r"(?:(?:what\s+is|what's|calculate|compute)\s*)?(?P<expr>[-+0-9.()*/^%][-+0-9.\s()*/^%]*)[?=]?", re.I),
+     "calculator", _calculator_parameters),
+    # "read <path>" where the path has an extension or directory part, e.g. "Read the README.md file"
+    (re.compile(r"read\s+(?:the\s+)?(?:file\s+)?(?P<path>[\w./-]+)(?:\s+file)?", re.I),
+     "file_reader", _file_reader_parameters),
+]
+# Longer requests are never simple enough for a prefilter; they go straight to the LLM
+_PREFILTER_MAX_INPUT_CHARS = 256
+
+# Tools whose responses are never served from the response cache: weather changes over time, and file_reader
+# output depends on the file on disk (it keeps its own cache keyed by path, mtime and size; paths are also case-sensitive)
+_UNCACHEABLE_TOOLS = {"weather_fetcher", "file_reader"}
+# Prefix app.py adds to requests that refer to an uploaded file (file contents may differ between uploads)
+_UPLOAD_MARKER = "(User uploaded file"
+
+def _normalize_input(user_input: str) -> str:
+    """Normalize a request for exact-match caching (case and whitespace insensitive)."""
+    return " ".join(user_input.lower().split())
+
+def _parameters_match_input(selection: Dict[str, Any], user_input: str) -> bool:
+    """True if a cached tool selection's parameter values all appear in the new request.
+
+    A semantically similar request may differ only in its arguments (a number, a city, a file name),
+    so a cached selection is only reused when its arguments were taken from text the new request contains.
+    """
+    if selection.get("tool") == "no_tool_needed":
+        return True # The response doesn't depend on the parameters
+    parameters = selection.get("parameters")
+    if not isinstance(parameters, dict):
+        return False
+    normalized_input = _normalize_input(user_input)
+    return all(_normalize_input(str(value)) in normalized_input for value in parameters.values())
+
+class _ResponseCache:
+    """A small thread-safe LRU cache mapping normalized user input to the final response."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key not in self._data:
+                return False, None
+            self._data.move_to_end(key)
+            return True, self._data[key]
+
+    def put(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
 class AIAgent:
     """A simple AI agent that can use tools to help users, powered by Together AI."""
     
     def __init__(self):
-        load_dotenv() # Ensures .env is loaded
         logger.info("Initializing AIAgent with Together AI...")
-        
-        # TOGETHER_API_KEY is expected to be in the environment variables
-        # The Together client can pick it up automatically if TOGETHER_API_KEY is set.
-        # Or, you can pass it explicitly: api_key=os.getenv("TOGETHER_API_KEY")
-        if not os.getenv("TOGETHER_API_KEY"):
-            logger.error("CRITICAL: TOGETHER_API_KEY not found in environment. Together AI client cannot be initialized.")
-            raise ValueError("TOGETHER_API_KEY not set in environment. Please set it in your .env file for the agent to work.")
+        # Heavy imports happen here rather than at module import, so `import main` stays cheap
+        from together import Together
+        try:
+            from together import AsyncTogether
+        except ImportError: # Older SDKs without an async client; process_request_async falls back to a worker thread
+            AsyncTogether = None
+        from tools.calculator import CalculatorTool
+        # from tools.opsera_search import OpseraSearchTool # Removed
+        from tools.file_reader import FileReaderTool
+        from tools.weather_fetcher import WeatherFetcherTool
 
+        # TOGETHER_API_KEY is loaded from .env by config.py; the clients raise if it is missing
         try:
-            self.client = Together() # Initialize Together client
+            self.client = Together(api_key=config.TOGETHER_API_KEY) # Initialize Together client
+            self.async_client = AsyncTogether(api_key=config.TOGETHER_API_KEY) if AsyncTogether is not None else None
+            # Pooled aiohttp session for async_client, created lazily on the event loop that uses it
+            self._aiohttp_session = None
+            self._aiohttp_loop = None
+            atexit.register(self._close_async_session)
             logger.info("Together AI client initialized.")
         except Exception as e:
             logger.error(f"Failed to initialize Together AI client: {e}", exc_info=True)
-            # If TOGETHER_API_KEY is not set, the above might not raise an error immediately
-            # but calls will fail. It's good practice to check for the key.
-            if not os.getenv("TOGETHER_API_KEY"): # This check is somewhat redundant due to the one above, but safe.
-                logger.error("TOGETHER_API_KEY not found in environment. Together AI calls will fail.")
             raise # Re-raise the exception
 
         self.tools = {
@@ -57,6 +135,16 @@ class AIAgent:
             "weather_fetcher": WeatherFetcherTool()
         }
         logger.debug(f"Tools loaded: {list(self.tools.keys())}")
+        # The tool set is fixed for the agent's lifetime, so build the prompt pieces once
+        self._tool_descs = "\n".join(f"- {tool.name}: {tool.description}" for tool in self.tools.values())
+        self._tool_names_csv = ", ".join(self.tools.keys())
+        # Expected parameter names per tool, used for error messages when the LLM passes the wrong arguments
+        self._tool_params = {
+            name: [p for p in inspect.signature(tool.execute).parameters if p != "self"]
+            for name, tool in self.tools.items()
+        }
+        self._response_cache = _ResponseCache(config.RESPONSE_CACHE_SIZE)
+        self._semantic_cache = self._init_semantic_cache()
         
         self.system_message = {
             "role": "system",
@@ -72,30 +160,62 @@ Available tools are: calculator, file_reader, weather_fetcher.'''
         # It also primes the LLM about what to do if no tool is needed.
         logger.debug("AIAgent initialization complete.")
     
+    def _init_semantic_cache(self) -> Optional[SemanticToolCache]:
+        """Creates the semantic tool-selection cache if enabled and its dependencies are installed."""
+        if not config.SEMANTIC_CACHE_ENABLED:
+            return None
+        if not SEMANTIC_CACHE_AVAILABLE:
+            logger.warning("SEMANTIC_CACHE_ENABLED is set but sqlite-vec/sentence-transformers are not installed. Semantic cache disabled.")
+            return None
+        try:
+            return SemanticToolCache(
+                db_path=config.SEMANTIC_CACHE_DB,
+                embedding_model=config.SEMANTIC_CACHE_EMBEDDING_MODEL,
+                namespace=config.TOGETHER_MODEL,
+                max_distance=config.SEMANTIC_CACHE_MAX_DISTANCE,
+                ttl_seconds=config.SEMANTIC_CACHE_TTL_SECONDS,
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize semantic cache, continuing without it: {e}", exc_info=True)
+            return None
+
     def _get_tool_descriptions(self) -> str:
-        """Get descriptions of all available tools."""
-        descriptions = []
-        for tool_name, tool_instance in self.tools.items():
-            # Ensure name and description properties exist
-            name = tool_instance.name
-            desc = tool_instance.description
-            descriptions.append(f"- {name}: {desc}")
-        return "\n".join(descriptions)
+        """Get descriptions of all available tools (precomputed in __init__)."""
+        return self._tool_descs
     
-    def _determine_tool(self, user_input: str) -> Dict[str, Any]:
-        """Use Together AI to determine which tool to use and with what parameters."""
-        logger.debug(f"Determining tool for user input with Together AI: {user_input}")
-        tool_descs = self._get_tool_descriptions()
-        
+    def _use_semantic_cache(self, user_input: str) -> bool:
+        # Uploaded-file requests carry a unique path in the parameters, so they're never looked up or stored
+        return self._semantic_cache is not None and _UPLOAD_MARKER not in user_input
+
+    def _semantic_cache_lookup(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """Returns a cached tool selection for a similar earlier request, or None."""
+        if not self._use_semantic_cache(user_input):
+            return None
+        try:
+            cached_selection = self._semantic_cache.lookup(user_input)
+            if cached_selection is None:
+                return None
+            if not _parameters_match_input(cached_selection, user_input):
+                # Similar wording but different arguments (e.g. "15 times 24" vs "15 times 25"): ask the LLM
+                logger.debug("Semantic cache near-miss, parameters differ: %s", cached_selection.get("parameters"))
+                return None
+            logger.info(f"Semantic cache hit, tool: {cached_selection.get('tool')} with params: {cached_selection.get('parameters')}")
+            return cached_selection
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed, falling back to LLM: {e}")
+            return None
+
+    def _tool_selection_request(self, user_input: str) -> Dict[str, Any]:
+        """Builds the chat completion arguments for the tool selection call."""
         # Constructing a more robust prompt for tool selection
         prompt_content = f'''Available tools:
-{tool_descs}
+{self._tool_descs}
 
 User request: "{user_input}"
 
 Which tool should be used to respond to this user request?
 If a tool is appropriate, respond with a JSON object with "tool" and "parameters" keys.
-The "tool" key should be one of [{', '.join(self.tools.keys())}].
+The "tool" key should be one of [{self._tool_names_csv}].
 The "parameters" key should be an object containing the arguments for the selected tool, based on its description and the user query.
 If no tool is suitable for the user's request, respond with:
 {{"tool": "no_tool_needed", "parameters": {{"original_query": "{user_input}"}}}}
@@ -106,80 +226,167 @@ Respond ONLY with the JSON object. Do not add any explanations or surrounding te
             self.system_message, 
             {"role": "user", "content": prompt_content}
         ]
-        
+        return {
+            "model": config.TOGETHER_MODEL,
+            "messages": messages,
+            "temperature": config.TOOL_SELECTION_TEMPERATURE, # Deterministic choice; also makes caching more effective
+            "response_format": {"type": "json_object"}, # Ask Together to return bare JSON (no markdown fences)
+        }
+
+    def _parse_tool_selection(self, user_input: str, raw_response_content: str) -> Dict[str, Any]:
+        """Parses and validates the LLM's tool selection, caching it semantically on success."""
+        logger.debug("Together AI LLM raw response for tool determination: %s", raw_response_content)
+
         try:
-            response = self.client.chat.completions.create(
-                model=config.TOGETHER_MODEL,
-                messages=messages,
-                temperature=config.LLM_TEMPERATURE,
-                # Consider adding response_format if supported and reliable for your Together model
-                # response_format={"type": "json_object"} # Example, syntax might vary
-            )
-            raw_response_content = response.choices[0].message.content
-            logger.debug(f"Together AI LLM raw response for tool determination: {raw_response_content}")
-            logger.info(f"[CRITICAL_DEBUG] Type of raw_response_content: {type(raw_response_content)}")
-            logger.info(f"[CRITICAL_DEBUG] Value of raw_response_content (initial): >>>{raw_response_content}<<<")
-            
-            result = {}
-            cleaned_response_for_parsing = raw_response_content # Start with the original raw content
+            result = _json_loads(raw_response_content)
+        except json.JSONDecodeError as je:
+            # Fallback for models that ignore response_format and wrap the JSON in text or markdown
+            logger.warning(f"JSON parsing failed on raw LLM response, attempting fallback regex. Error: {je}")
+            match_json_fallback = _JSON_BLOCK_RE.search(raw_response_content)
+            try:
+                result = _json_loads(match_json_fallback.group(0) if match_json_fallback else "")
+                logger.info("Fallback regex parsing successful!")
+            except json.JSONDecodeError as je_fallback:
+                logger.error(f"Could not extract JSON from LLM response ({je_fallback}). Raw response was: >>>{raw_response_content}<<<")
+                return {"tool": "error_parsing_llm_response", "parameters": {"details": "Could not parse JSON from LLM response.", "raw_content": raw_response_content}}
+
+        # Validate basic structure (if parsing succeeded)
+        if not isinstance(result, dict) or "tool" not in result:
+            logger.error(f"LLM response was not a valid JSON object with a 'tool' key. Parsed: {result}")
+            return {"tool": "error_invalid_llm_response_structure", "parameters": {"details": "LLM response not a dict or missing 'tool' key.", "parsed_content": result}}
+
 
+        logger.info(f"Together AI LLM determined tool: {result.get('tool')} with params: {result.get('parameters')}")
+        if self._use_semantic_cache(user_input):
             try:
-                # Perform all cleaning steps on 'cleaned_response_for_parsing'
-                cleaned_response_for_parsing = cleaned_response_for_parsing.strip()
-                logger.info(f"[CRITICAL_DEBUG] Value after strip(): >>>{cleaned_response_for_parsing}<<<")
-                
-                # Markdown cleaning (be careful with this if LLM isn't adding markdown)
-                if cleaned_response_for_parsing.startswith("```json"):
-                    cleaned_response_for_parsing = cleaned_response_for_parsing[len("```json"):].strip()
-                elif cleaned_response_for_parsing.startswith("```"):
-                     cleaned_response_for_parsing = cleaned_response_for_parsing[len("```"):].strip()
-                if cleaned_response_for_parsing.endswith("```"):
-                    cleaned_response_for_parsing = cleaned_response_for_parsing[:-len("```")].strip()
-                
-                logger.info(f"[CRITICAL_DEBUG] Value of cleaned_response_for_parsing (after markdown clean): >>>{cleaned_response_for_parsing}<<<")
-                
-                # Direct parsing attempt
-                result = json.loads(cleaned_response_for_parsing)
-
-            except json.JSONDecodeError as je:
-                # Log all relevant states at the point of failure
-                logger.warning(f"JSON parsing failed on 'cleaned_response_for_parsing'. Error: {je}")
-                logger.info(f"[CRITICAL_DEBUG_EXCEPTION] Value of cleaned_response_for_parsing at failure: >>>{cleaned_response_for_parsing}<<<")
-                logger.info(f"[CRITICAL_DEBUG_EXCEPTION] Original raw_response_content at failure: >>>{raw_response_content}<<<") # Check if this is different
-                
-                # Fallback to regex on the *original* raw_response_content, just in case cleaning was the issue
-                logger.info("Attempting fallback regex on original raw_response_content...")
-                match_markdown_fallback = re.search(r"\{.*?\}", raw_response_content, re.DOTALL) # Use simpler regex on raw
-                if match_markdown_fallback:
-                    json_str_fallback = match_markdown_fallback.group(0)
-                    logger.info(f"Fallback regex extracted: >>>{json_str_fallback}<<< trying to parse this.")
-                    try:
-                        result = json.loads(json_str_fallback)
-                        logger.info("Fallback regex parsing successful!")
-                    except json.JSONDecodeError as je_fallback:
-                        logger.error(f"Fallback regex parsing also failed: {je_fallback}")
-                        logger.error(f"Could not ultimately extract JSON. Original raw_response_content was: >>>{raw_response_content}<<<")
-                        return {"tool": "error_parsing_llm_response", "parameters": {"details": "Could not parse JSON from LLM after cleaning and fallback.", "raw_content": raw_response_content}}
-                else:
-                    logger.error(f"Fallback regex found no JSON in original raw_response_content: >>>{raw_response_content}<<<")
-                    return {"tool": "error_parsing_llm_response", "parameters": {"details": "Could not parse JSON from LLM, and fallback regex found nothing.", "raw_content": raw_response_content}}
-            
-            # Validate basic structure (if parsing succeeded)
-            if not isinstance(result, dict) or "tool" not in result:
-                logger.error(f"LLM response was not a valid JSON object with a 'tool' key. Parsed: {result}")
-                return {"tool": "error_invalid_llm_response_structure", "parameters": {"details": "LLM response not a dict or missing 'tool' key.", "parsed_content": result}}
+                self._semantic_cache.store(user_input, result)
+            except Exception as e:
+                logger.warning(f"Failed to store tool selection in semantic cache: {e}")
+        return result
+
+    def _prefilter_tool(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """Returns a tool selection for requests unambiguous enough to skip the LLM, or None."""
+        if len(user_input) > _PREFILTER_MAX_INPUT_CHARS:
+            return None
+        user_input = user_input.strip()
+        for pattern, tool_name, build_parameters in _PREFILTERS:
+            match = pattern.fullmatch(user_input)
+            parameters = build_parameters(match) if match else None
+            if parameters is not None:
+                selection = {"tool": tool_name, "parameters": parameters}
+                logger.info(f"Prefilter matched, tool: {tool_name} with params: {selection['parameters']}")
+                return selection
+        return None
 
+    def _determine_tool(self, user_input: str) -> Dict[str, Any]:
+        """Use Together AI to determine which tool to use and with what parameters."""
+        logger.debug(f"Determining tool for user input with Together AI: {user_input}")
+        cached_selection = self._semantic_cache_lookup(user_input)
+        if cached_selection is not None:
+            return cached_selection
 
-            logger.info(f"Together AI LLM determined tool: {result.get('tool')} with params: {result.get('parameters')}")
-            return result
+        try:
+            response = self.client.chat.completions.create(**self._tool_selection_request(user_input))
+            return self._parse_tool_selection(user_input, response.choices[0].message.content)
         except Exception as e:
             logger.error(f"Error in _determine_tool with client {type(self.client)}: {e}", exc_info=True)
             return {"tool": "error_in_tool_determination", "parameters": {"details": str(e)}}
-    
-    def process_request(self, user_input: str) -> str:
+
+    def _use_pooled_async_session(self) -> None:
+        """Points the async Together client at one keep-alive aiohttp session for the running loop.
+
+        The sync client already keeps a requests.Session per thread, but without this the async
+        client opens and closes a new aiohttp session (a fresh TCP+TLS connection) on every call.
+        """
+        import together
+        if getattr(together, "aiosession", None) is None:
+            return
+        import aiohttp # Installed with the together SDK; only needed on the async path
+
+        loop = asyncio.get_running_loop()
+        if self._aiohttp_session is None or self._aiohttp_session.closed or self._aiohttp_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=config.TOGETHER_MAX_CONNECTIONS,
+                keepalive_timeout=config.TOGETHER_KEEPALIVE_SECONDS,
+            )
+            self._aiohttp_session = aiohttp.ClientSession(connector=connector)
+            self._aiohttp_loop = loop
+        # The SDK reads this ContextVar per request; setting it here scopes it to the current task
+        together.aiosession.set(self._aiohttp_session)
+
+    def _close_async_session(self) -> None:
+        """Best-effort close of the pooled aiohttp session at interpreter exit."""
+        session, loop = self._aiohttp_session, self._aiohttp_loop
+        if session is None or session.closed or loop is None or loop.is_closed() or loop.is_running():
+            return
+        try:
+            loop.run_until_complete(session.close())
+        except Exception as e:
+            logger.debug("Failed to close pooled aiohttp session: %s", e)
+
+    async def _determine_tool_async(self, user_input: str) -> Dict[str, Any]:
+        """Async variant of _determine_tool; the LLM round trip is awaited instead of blocking a thread."""
+        if self.async_client is None:
+            return await asyncio.to_thread(self._determine_tool, user_input)
+        logger.debug(f"Determining tool for user input with Together AI (async): {user_input}")
+        # Embedding for the semantic cache is CPU-bound, so it runs off the event loop
+        if self._use_semantic_cache(user_input):
+            cached_selection = await asyncio.to_thread(self._semantic_cache_lookup, user_input)
+            if cached_selection is not None:
+                return cached_selection
+
+        try:
+            self._use_pooled_async_session()
+            response = await self.async_client.chat.completions.create(**self._tool_selection_request(user_input))
+            raw_response_content = response.choices[0].message.content
+            if self._use_semantic_cache(user_input): # Storing embeds the request, so keep it off the event loop
+                return await asyncio.to_thread(self._parse_tool_selection, user_input, raw_response_content)
+            return self._parse_tool_selection(user_input, raw_response_content)
+        except Exception as e:
+            logger.error(f"Error in _determine_tool_async with client {type(self.async_client)}: {e}", exc_info=True)
+            return {"tool": "error_in_tool_determination", "parameters": {"details": str(e)}}
+
+    def _response_cache_key(self, user_input: str, no_cache: bool) -> Optional[str]:
+        """Returns the response cache key for a request, or None if it must not be cached."""
+        if no_cache or _UPLOAD_MARKER in user_input:
+            return None
+        return _normalize_input(user_input)
+
+    def process_request(self, user_input: str, no_cache: bool = False) -> str:
         logger.info(f"Processing user request: {user_input}")
+        cache_key = self._response_cache_key(user_input, no_cache)
+        if cache_key is not None:
+            hit, cached_response = self._response_cache.get(cache_key)
+            if hit:
+                logger.info("Returning cached response for request.")
+                return cached_response
+
+        tool_selection = self._prefilter_tool(user_input) or self._determine_tool(user_input)
+        response, cacheable = self._run_tool_selection(user_input, tool_selection)
+        if cache_key is not None and cacheable:
+            self._response_cache.put(cache_key, response)
+        return response
+
+    async def process_request_async(self, user_input: str, no_cache: bool = False) -> str:
+        """Async variant of process_request for event-loop servers such as Gradio."""
+        logger.info(f"Processing user request (async): {user_input}")
+        cache_key = self._response_cache_key(user_input, no_cache)
+        if cache_key is not None:
+            hit, cached_response = self._response_cache.get(cache_key)
+            if hit:
+                logger.info("Returning cached response for request.")
+                return cached_response
+
+        tool_selection = self._prefilter_tool(user_input) or await self._determine_tool_async(user_input)
+        # Tools do blocking I/O (files, HTTP), so they run in a worker thread
+        response, cacheable = await asyncio.to_thread(self._run_tool_selection, user_input, tool_selection)
+        if cache_key is not None and cacheable:
+            self._response_cache.put(cache_key, response)
+        return response
+
+    def _run_tool_selection(self, user_input: str, tool_selection: Dict[str, Any]) -> Tuple[Any, bool]:
+        """Executes the selected tool. Returns (response, whether the response may be cached)."""
         try:
-            tool_selection = self._determine_tool(user_input)
             tool_name = tool_selection.get("tool")
             parameters = tool_selection.get("parameters", {}) # Default to empty dict
 
@@ -190,16 +397,16 @@ Respond ONLY with the JSON object. Do not add any explanations or surrounding te
             if tool_name in ["error_parsing_llm_response", "error_in_tool_determination", "error_invalid_llm_response_structure"]:
                 error_details = parameters.get('details', 'Unknown error during tool determination.')
                 logger.error(f"Tool determination failed: {tool_name}, Details: {error_details}")
-                return f"Sorry, I had trouble deciding which tool to use. Details: {error_details}"
+                return f"Sorry, I had trouble deciding which tool to use. Details: {error_details}", False
             
             if tool_name == "no_tool_needed" or not tool_name:
                 logger.info(f"LLM determined no tool is needed or did not specify a tool for: '{user_input}'.")
                 # You could potentially call another LLM here for a direct answer without tools.
-                return "I've processed your request. No specific tool was needed, or I couldn't determine one. How else can I help?"
+                return "I've processed your request. No specific tool was needed, or I couldn't determine one. How else can I help?", True
 
             if tool_name not in self.tools:
                 logger.warning(f"Tool '{tool_name}' not found or not recognized by LLM (available: {list(self.tools.keys())}).")
-                return f"Sorry, I don't know how to use the tool '{tool_name}' or it's not available."
+                return f"Sorry, I don't know how to use the tool '{tool_name}' or it's not available.", False
             
             tool = self.tools[tool_name]
             logger.info(f"Executing tool: {tool_name} with parameters: {parameters}")
@@ -207,43 +414,35 @@ Respond ONLY with the JSON object. Do not add any explanations or surrounding te
             try:
                 result = tool.execute(**parameters) # Pass parameters as keyword arguments
                 logger.info(f"Tool {tool_name} executed. Result (first 100 chars): {str(result)[:100]}")
-                return result # Return raw result
+                # Tools report failures as "Error..." strings; those must not be cached, the cause may be fixed next time
+                is_error = isinstance(result, str) and result.startswith("Error")
+                return result, tool_name not in _UNCACHEABLE_TOOLS and not is_error # Return raw result
             except TypeError as te: 
                 logger.error(f"TypeError executing tool {tool_name} with params {parameters}: {te}", exc_info=True)
-                # Attempt to get expected parameters for a more helpful error message
-                try:
-                    sig = inspect.signature(tool.execute)
-                    expected_params = list(sig.parameters.keys())
-                    # Remove 'self' if it's a method
-                    if 'self' in expected_params: expected_params.remove('self')
-                    error_message = f"Error using tool {tool_name}: incorrect parameters. Expected: {expected_params}. Got: {list(parameters.keys())}. Details: {te}"
-                except: # Fallback if introspection fails
-                    error_message = f"Error using tool {tool_name}: incorrect parameters. Details: {te}"
-                return error_message # Return the specific error message
+                expected_params = self._tool_params.get(tool_name, [])
+                error_message = f"Error using tool {tool_name}: incorrect parameters. Expected: {expected_params}. Got: {list(parameters.keys())}. Details: {te}"
+                return error_message, False # Return the specific error message
             except Exception as e:
                 logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
-                return f"Sorry, an error occurred while using the {tool_name} tool: {e}"
+                return f"Sorry, an error occurred while using the {tool_name} tool: {e}", False
             
         except Exception as e: # Catch-all for unexpected errors during request processing
             logger.error(f"An unexpected error occurred in process_request: {e}", exc_info=True)
-            return f"An unexpected error occurred: {e}"
+            return f"An unexpected error occurred: {e}", False
 
 def initialize_agent() -> Optional[AIAgent]:
     """Initializes the AIAgent, handling potential errors during setup."""
     logger.info("Attempting to initialize AI Agent (Together AI)...")
-    load_dotenv() 
-    if not os.getenv("TOGETHER_API_KEY"):
-        logger.error("CRITICAL: TOGETHER_API_KEY environment variable not set. Agent cannot start.")
-        # This message will also be printed by the print statement in config.py if it's imported first.
-        # Consider if you want duplicate console messages or manage it in one place.
-        print("Error: TOGETHER_API_KEY not set. Please add it to your .env file.")
+    if not config.TOGETHER_API_KEY:
+        # config.py has already printed a warning about the missing key at import
+        logger.error("CRITICAL: TOGETHER_API_KEY not set. Agent cannot start.")
         return None
     try:
         agent = AIAgent()
         logger.info("AI Agent (Together AI) initialized successfully.")
         return agent
     except Exception as e:
-        # The AIAgent __init__ now raises ValueError if key is missing, or re-raises other init errors.
+        # The AIAgent __init__ re-raises Together client initialization errors.
         logger.error(f"Failed to initialize AI Agent (Together AI): {e}", exc_info=True)
         print(f"Error: Failed to initialize AI Agent: {e}. Check agent.log for details.")
         return None
@@ -0,0 +1,85 @@
+"""Semantic cache for tool selection, backed by sqlite-vec and a small local embedding model."""
+
+import importlib.util
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# The optional dependencies (sentence-transformers pulls in torch) are only imported when a cache is created,
+# so importing this module stays cheap while the feature is disabled. The flag just records they are installed.
+SEMANTIC_CACHE_AVAILABLE = (
+    importlib.util.find_spec("sqlite_vec") is not None
+    and importlib.util.find_spec("sentence_transformers") is not None
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticToolCache:
+    """Maps user requests to previously determined {"tool", "parameters"} selections.
+
+    Lookups embed the request locally and return the nearest cached selection if its
+    cosine distance is below `max_distance`. Entries are namespaced by the LLM model id,
+    so switching models never serves selections made by a different model.
+    """
+
+    def __init__(self, db_path: str, embedding_model: str, namespace: str,
+                 max_distance: float = 0.1, ttl_seconds: float = 3600):
+        if not SEMANTIC_CACHE_AVAILABLE:
+            raise RuntimeError("Semantic cache requires the 'sqlite-vec' and 'sentence-transformers' packages.")
+        import sqlite_vec
+        from sentence_transformers import SentenceTransformer
+        self._sqlite_vec = sqlite_vec
+        self.namespace = namespace
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._model = SentenceTransformer(embedding_model)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.enable_load_extension(True)
+        sqlite_vec.load(self._db)
+        self._db.enable_load_extension(False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "namespace TEXT NOT NULL, embedding BLOB NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_tool_cache_namespace ON tool_cache (namespace, created_at)")
+        self._db.commit()
+        logger.info(f"Semantic tool cache ready (db={db_path}, model={embedding_model}, max_distance={max_distance}).")
+
+    def _embed(self, text: str) -> bytes:
+        embedding = self._model.encode(text, normalize_embeddings=True)
+        return self._sqlite_vec.serialize_float32(embedding.tolist())
+
+    def lookup(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """Return the cached tool selection for a similar request, or None on a miss."""
+        embedding = self._embed(user_input)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, vec_distance_cosine(embedding, ?) AS distance FROM tool_cache "
+                "WHERE namespace = ? AND created_at >= ? ORDER BY distance LIMIT 1",
+                (embedding, self.namespace, time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None or row[1] >= self.max_distance:
+            return None
+        logger.debug("Semantic cache hit (distance=%.4f)", row[1])
+        return json.loads(row[0])
+
+    def store(self, user_input: str, result: Dict[str, Any]) -> None:
+        """Cache a tool selection and drop this namespace's expired entries."""
+        embedding = self._embed(user_input)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO tool_cache (namespace, embedding, result, created_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, embedding, json.dumps(result), now),
+            )
+            self._db.execute(
+                "DELETE FROM tool_cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, now - self.ttl_seconds),
+            )
+            self._db.commit()
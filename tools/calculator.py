@@ -1,17 +1,91 @@
 from .base_tool import BaseTool
 from typing import Dict, Any, Union
+from functools import lru_cache
+import ast
+import math
+
+class _DisallowedExpressionError(Exception):
+    """Raised when an expression contains syntax the calculator does not evaluate."""
+
+# Integer results may not exceed this many bits: big-int ** and factorial() are otherwise unbounded CPU work
+# (e.g. 9^9^9). Far beyond the float range the result is converted to anyway.
+_MAX_RESULT_BITS = 10000
+_MAX_FACTORIAL_ARG = 1000 # factorial(1000) is ~8500 bits
+
+def _bounded_pow(base, exponent):
+    """Exponentiation that refuses integer results larger than _MAX_RESULT_BITS."""
+    if (isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1
+            and exponent * (abs(base).bit_length() - 1) > _MAX_RESULT_BITS):
+        raise _DisallowedExpressionError(f"result of {base} ** {exponent} is too large")
+    return base ** exponent
+
+def _bounded_factorial(n):
+    if isinstance(n, int) and n > _MAX_FACTORIAL_ARG:
+        raise _DisallowedExpressionError(f"factorial() argument {n} is too large (max {_MAX_FACTORIAL_ARG})")
+    return math.factorial(n)
+
+def _check_product_size(name, n, factors):
+    """comb/perm multiply `factors` numbers of at most n's size; reject when that product would be too large."""
+    if isinstance(n, int) and isinstance(factors, int) and factors > 0 and factors * n.bit_length() > _MAX_RESULT_BITS:
+        raise _DisallowedExpressionError(f"result of {name}() is too large (max {_MAX_RESULT_BITS} bits)")
+
+def _bounded_comb(n, k):
+    # comb(n, k) == comb(n, n - k): the work is driven by the smaller of the two, not by n
+    if isinstance(n, int) and isinstance(k, int):
+        _check_product_size("comb", n, min(k, n - k))
+    return math.comb(n, k)
+
+def _bounded_perm(n, k=None):
+    _check_product_size("perm", n, n if k is None else k)
+    return math.perm(n, k)
+
+# Math functions and constants available to expressions, built once at import time
+_SAFE_NS = {name: getattr(math, name) for name in dir(math) if not name.startswith("_")}
+_SAFE_NS.update(factorial=_bounded_factorial, comb=_bounded_comb, perm=_bounded_perm)
+# The ** operator is compiled into a call to this name (see _PowToCall)
+_SAFE_NS["__pow"] = _bounded_pow
+
+# AST node types an expression may contain; anything else (attributes, subscripts, lambdas, ...) is rejected
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.Call,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Pow, ast.Mod, ast.USub, ast.UAdd,
+)
+
+class _PowToCall(ast.NodeTransformer):
+    """Rewrites `a ** b` as `__pow(a, b)` so every exponentiation goes through _bounded_pow."""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(ast.Call(func=ast.Name(id="__pow", ctx=ast.Load()), args=[node.left, node.right], keywords=[]), node)
+        return node
+
+@lru_cache(maxsize=256)
+def _compile(expression: str):
+    """Parses and validates an expression, returning a code object ready for eval()."""
+    # Replace ^ with ** for Python's exponentiation
+    tree = ast.parse(expression.replace('^', '**'), mode='eval')
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise _DisallowedExpressionError(f"unsupported syntax '{type(node).__name__}'")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise _DisallowedExpressionError("only numeric constants are allowed")
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+            raise _DisallowedExpressionError("only plain calls to math functions are allowed")
+    tree = ast.fix_missing_locations(_PowToCall().visit(tree))
+    return compile(tree, '<calc>', 'eval')
 
 class CalculatorTool(BaseTool):
     """A tool for performing basic arithmetic calculations."""
-    
+
     @property
     def name(self) -> str:
         return "calculator"
-    
+
     @property
     def description(self) -> str:
         return "Performs basic arithmetic calculations. Input should be a single string expression like '5 + 3' or '10 * 2 / (4 - 2)'."
-    
+
     def get_schema(self) -> Dict[str, Any]:
         return {
             "type": "object",
@@ -23,48 +97,19 @@ class CalculatorTool(BaseTool):
             },
             "required": ["expression"]
         }
-    
+
     def execute(self, expression: str) -> Union[float, str]:
         """Evaluates a mathematical expression string."""
-        
-        # Basic whitelist of allowed characters for the expression
-        # This is a simple attempt to prevent arbitrary code execution with eval().
-        # A more robust solution would be to use a proper math expression parser.
-        allowed_chars = set("0123456789+-*/(). " + "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_" ) # Allow functions like pow, sqrt
-        
-        # Allow common math functions from the math module for the eval context
-        # This is a safer alternative than importing everything from math
-        import math
-        safe_math_functions = {
-            name: getattr(math, name) 
-            for name in dir(math) 
-            if callable(getattr(math, name)) and not name.startswith("__")
-        }
-        # Add common constants
-        safe_math_functions['pi'] = math.pi
-        safe_math_functions['e'] = math.e
-        
-        # Create a limited global scope for eval
-        eval_globals = {
-            "__builtins__": {},
-            **safe_math_functions
-        }
 
         if not expression.strip():
             return "Error: Empty expression provided."
-        
-        # Validate characters in expression more carefully
-        # This regex allows numbers, operators, parentheses, spaces, and function names/constants (alphanumeric with underscore)
-        import re
-        if not re.match(r"^[a-zA-Z0-9\s_.\+\-\*/\(\)\^%]*$", expression):
-             return f"Error: Expression '{expression}' contains invalid characters."
 
-        try:
-            # Replace ^ with ** for Python's exponentiation
-            processed_expression = expression.replace('^', '**')
+        # No character pre-check is needed: _compile() rejects any syntax outside the AST whitelist
 
-            # Evaluate the expression in a restricted environment
-            result = eval(processed_expression, eval_globals, {})
+        try:
+            # The expression is parsed and whitelisted node-by-node (cached per expression string),
+            # then evaluated with no builtins and only the math namespace available
+            result = eval(_compile(expression), {"__builtins__": {}}, _SAFE_NS)
             if isinstance(result, (int, float)):
                 return float(result)
             else:
@@ -74,10 +119,12 @@ class CalculatorTool(BaseTool):
             return "Error: Cannot divide by zero."
         except SyntaxError:
             return f"Error: Invalid syntax in expression: '{expression}'."
+        except _DisallowedExpressionError as de:
+            return f"Error: Unsupported expression '{expression}': {de}"
         except NameError as ne:
              return f"Error: Unknown function or variable in expression: '{expression}'. Details: {ne}"
         except TypeError as te:
             return f"Error: Type error in expression '{expression}'. Check function arguments. Details: {te}"
         except Exception as e:
             # Catch any other unexpected errors
-            return f"Error calculating expression '{expression}': {str(e)} (Type: {type(e).__name__})" 
\ No newline at end of file
+            return f"Error calculating expression '{expression}': {str(e)} (Type: {type(e).__name__})"
\ No newline at end of file
@@ -1,15 +1,30 @@
+import codecs
+import errno
+import importlib.util
+import io
+import mmap
 import os
+import stat
+import threading
 from .base_tool import BaseTool
 from typing import Dict, Any
 import logging # Add logging import
 import re # Import re for text cleaning
+from functools import lru_cache
 
-# Attempt to import PyPDF2 and set a flag
-try:
-    import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
-    PYPDF2_AVAILABLE = False
+# PDF libraries are only imported on the first PDF request (see _get_pdf_backend), so text-only use never pays
+# for them. These flags just record whether each one is installed: PyMuPDF (preferred, native MuPDF engine; older
+# releases only provide the 'fitz' module name) and PyPDF2 (pure-Python fallback).
+PYMUPDF_AVAILABLE = importlib.util.find_spec("pymupdf") is not None or importlib.util.find_spec("fitz") is not None
+PYPDF2_AVAILABLE = importlib.util.find_spec("PyPDF2") is not None
+
+_BACKEND_UNRESOLVED = object() # Sentinel: _get_pdf_backend() has not run yet (None means "no usable backend")
+_pdf_backend = _BACKEND_UNRESOLVED
+# Exceptions meaning "this is not a readable PDF" for the loaded backend; filled in by _get_pdf_backend()
+_PDF_READ_ERRORS = ()
+# PyMuPDF must not be used from several threads at once (not even with separate documents), and tools run in
+# worker threads (asyncio.to_thread, Gradio concurrency), so every PyMuPDF open/extract holds this lock
+_PYMUPDF_LOCK = threading.Lock()
 
 logger = logging.getLogger(__name__) # Initialize logger for this module
 
@@ -17,38 +32,152 @@ logger = logging.getLogger(__name__) # Initialize logger for this module
 # This helps in sandboxing file access. For this example, we use os.getcwd().
 # In a more secure application, this should be a strictly defined and controlled directory.
 FILE_READ_BASE_PATH = os.getcwd() 
+# Resolved once: symlinks in the base are followed so containment checks compare real locations
+_BASE = os.path.realpath(FILE_READ_BASE_PATH)
+# The base with exactly one trailing separator: a prefix match on it compares whole path components
+_BASE_PREFIX = os.path.join(_BASE, "")
 MAX_FILE_SIZE_BYTES = 1024 * 1024  # 1MB limit for reading
 MAX_CHARS_RETURN = 10000 # Increased slightly for potentially longer text extractions
+# Bytes read from a text file: enough for MAX_CHARS_RETURN + 1 characters even if all are 4-byte UTF-8
+TEXT_READ_BYTES = (MAX_CHARS_RETURN + 1) * 4
+BINARY_SNIFF_BYTES = 512 # Leading bytes inspected to reject binary files before decoding
+BINARY_CONTROL_RATIO = 0.3 # Share of control bytes above which a file is treated as binary
+# Bytes that occur in text: tab/newline/CR/etc. and everything from space up (bytes >= 0x80 are left to the UTF-8 decoder)
+_TEXT_BYTES = bytes(range(9, 14)) + bytes(range(32, 256))
+# Stop extracting PDF pages once this much raw text is collected (2x headroom for whitespace cleanup shrinkage)
+PDF_EXTRACT_CHAR_BUDGET = MAX_CHARS_RETURN * 2
+
+# Whitespace-normalization patterns for extracted PDF text, compiled once
+_RE_MULTI_SPACE = re.compile(r' {2,}') # Only actual runs; single spaces are left alone instead of being rewritten
+# stat() errors that just mean "there is no such file at this path"
+_NOT_FOUND_ERRNOS = {errno.ENOENT, errno.ENOTDIR, errno.ENAMETOOLONG}
+# A '..' path segment (not just any '..' substring, so names like 'notes..v2.txt' are allowed)
+_TRAVERSAL_RE = re.compile(r'(^|[/\\])\.\.([/\\]|$)')
+
+def _clean_pdf_text(text: str, normalize_lines: bool = True) -> str:
+    """Cleans extracted PDF text by normalizing whitespace.
 
-def _clean_pdf_text(text: str) -> str:
-    """Cleans extracted PDF text by normalizing whitespace."""
+    `normalize_lines=False` skips the line pass for backends (PyMuPDF) that already emit one clean line per text line.
+    Both passes are linear in the extracted text, which is at most PDF_EXTRACT_CHAR_BUDGET plus the last page
+    appended (the budget is checked per page), so cleaning stays cheap next to page extraction itself, which also
+    scales with that text; a JIT-compiled cleaner would not pay for its dependency.
+    """
     if not text:
         return ""
     # Replace multiple spaces with a single space
-    text = re.sub(r' +', ' ', text)
-    # Replace multiple newlines with a single newline
-    text = re.sub(r'\\n+', '\\n', text)
-    # Remove leading/trailing whitespace from each line
-    text = "\\n".join([line.strip() for line in text.split('\\n')])
-    # Replace sequences of space-newline-space (often from column breaks or formatting) with a single space
-    text = re.sub(r' \\n ', ' ', text)
+    text = _RE_MULTI_SPACE.sub(' ', text)
+    if normalize_lines:
+        # Strip whitespace at the start/end of every line and drop blank lines. A single split keeps this
+        # linear; a regex like \s*\n\s* backtracks quadratically on long newline-free whitespace runs (e.g. tabs)
+        text = "\n".join(stripped for line in text.split("\n") if (stripped := line.strip()))
     # Finally, strip leading/trailing whitespace from the whole text
     return text.strip()
 
+def _get_pdf_backend():
+    """Imports the preferred PDF library on first use and returns it as ("pymupdf" | "pypdf2", module), or None."""
+    global _pdf_backend, _PDF_READ_ERRORS
+    if _pdf_backend is not _BACKEND_UNRESOLVED:
+        return _pdf_backend
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            import fitz as pymupdf
+        except ImportError:
+            pymupdf = None
+    if pymupdf is not None:
+        _PDF_READ_ERRORS = (getattr(pymupdf, "FileDataError", RuntimeError),)
+        _pdf_backend = ("pymupdf", pymupdf)
+    else:
+        try:
+            import PyPDF2
+            _PDF_READ_ERRORS = (PyPDF2.errors.PdfReadError,)
+            _pdf_backend = ("pypdf2", PyPDF2)
+        except ImportError:
+            _pdf_backend = None
+    logger.debug("PDF backend resolved to: %s", _pdf_backend[0] if _pdf_backend else None)
+    return _pdf_backend
+
+def _extract_pdf_text(absolute_filepath: str) -> str:
+    """Extracts and cleans the text of a PDF, stopping once PDF_EXTRACT_CHAR_BUDGET is reached."""
+    backend_name, pdf_module = _get_pdf_backend()
+    if backend_name == "pymupdf":
+        # PyMuPDF extracts text in native code, many times faster than pure-Python PyPDF2
+        # Pages are extracted sequentially on purpose: PyMuPDF is not thread-safe (see _PYMUPDF_LOCK), and the
+        # char budget usually stops within a few pages
+        buf = io.StringIO() # Pages are appended as they are extracted; tell() doubles as the running length
+        with _PYMUPDF_LOCK, pdf_module.open(absolute_filepath) as doc:
+            for page in doc:
+                # Every page's text already ends with a newline, so pages are written back to back (no blank lines to collapse)
+                buf.write(page.get_text("text"))
+                if buf.tell() > PDF_EXTRACT_CHAR_BUDGET:
+                    break # Enough text for the returned (truncated) content; skip remaining pages
+        # PyMuPDF does keep runs of spaces from the content stream, so only that pass of the cleaner is still needed
+        raw_content = buf.getvalue()
+        content = _clean_pdf_text(raw_content, normalize_lines=False)
+    else:
+        with open(absolute_filepath, 'rb') as f:
+            # PyPDF2 seeks around the file constantly; a read-only memory map serves those reads straight
+            # from the page cache instead of through Python's buffered IO (empty files can't be mapped)
+            with (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else f) as stream:
+                reader = pdf_module.PdfReader(stream)
+                buf = io.StringIO()
+                for page_num in range(len(reader.pages)):
+                    page = reader.pages[page_num]
+                    extracted_text = page.extract_text()
+                    if extracted_text:
+                        buf.write(extracted_text)
+                        buf.write("\n") # Page separator; the cleaner strips the trailing one
+                    if buf.tell() > PDF_EXTRACT_CHAR_BUDGET:
+                        break # Bound work by output size, not page count
+        raw_content = buf.getvalue()
+        content = _clean_pdf_text(raw_content)
+    logger.debug("Extracted text from PDF '%s'. Original length: %d, Cleaned length: %d", absolute_filepath, len(raw_content), len(content))
+    return content
+
+# The file's mtime and size are part of the cache key, so edited files are re-read rather than served stale
+@lru_cache(maxsize=128)
+def _read_pdf_cached(absolute_filepath: str, mtime_ns: int, size: int) -> str:
+    # Keep one char past the cap so execute() can still tell the content was truncated
+    return _extract_pdf_text(absolute_filepath)[:MAX_CHARS_RETURN + 1]
+
+class _BinaryFileError(Exception):
+    """Raised when a file's leading bytes show it is binary rather than text."""
+
+@lru_cache(maxsize=128)
+def _read_text_cached(absolute_filepath: str, mtime_ns: int, size: int) -> str:
+    # A single unbuffered read of the prefix we need; skips the TextIOWrapper/BufferedReader layers
+    fd = os.open(absolute_filepath, os.O_RDONLY)
+    try:
+        raw = os.read(fd, TEXT_READ_BYTES)
+    finally:
+        os.close(fd)
+    # A NUL byte or a high share of control bytes in the head means binary; reject it without a decode attempt
+    head = raw[:BINARY_SNIFF_BYTES]
+    if b'\x00' in head or len(head.translate(None, _TEXT_BYTES)) > len(head) * BINARY_CONTROL_RATIO:
+        raise _BinaryFileError()
+    # If the read stopped mid-file it may end inside a multi-byte character; a non-final incremental
+    # decode holds those trailing bytes back instead of raising, while invalid UTF-8 still raises
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    return decoder.decode(raw, final=len(raw) < TEXT_READ_BYTES)[:MAX_CHARS_RETURN + 1]
+
 class FileReaderTool(BaseTool):
     """A tool for reading content from files (text, PDF)."""
 
+    def __init__(self):
+        # The description only depends on module-level settings, so build it once instead of on every access
+        self._description = f"Reads content from specified files. Supports plain text and PDF. Use 'file_path' for relative path. Max content returned: {MAX_CHARS_RETURN} chars."
+        if not (PYMUPDF_AVAILABLE or PYPDF2_AVAILABLE):
+            self._description += " (PDF support potentially limited or disabled due to missing PyMuPDF/PyPDF2 libraries)" # Slightly reworded
+        logger.info(f"FileReaderTool initialized. PYMUPDF_AVAILABLE: {PYMUPDF_AVAILABLE}, PYPDF2_AVAILABLE: {PYPDF2_AVAILABLE}") # Log availability once at init
+
     @property
     def name(self) -> str:
         return "file_reader"
 
     @property
     def description(self) -> str:
-        desc = f"Reads content from specified files. Supports plain text and PDF. Use 'file_path' for relative path. Max content returned: {MAX_CHARS_RETURN} chars."
-        if not PYPDF2_AVAILABLE:
-            desc += " (PDF support potentially limited or disabled due to missing PyPDF2 library)" # Slightly reworded
-        logger.info(f"FileReaderTool initialized. PYPDF2_AVAILABLE: {PYPDF2_AVAILABLE}") # Log availability at init
-        return desc
+        return self._description
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -63,79 +192,82 @@ class FileReaderTool(BaseTool):
         }
 
     def execute(self, file_path: str) -> str:
-        logger.debug(f"FileReaderTool execute called for file_path: '{file_path}'") # Log entry
-        logger.debug(f"PYPDF2_AVAILABLE at execution time: {PYPDF2_AVAILABLE}") # Log flag status
+        # Debug messages use lazy %-style arguments so nothing is formatted unless DEBUG is enabled
+        logger.debug("FileReaderTool execute called for file_path: '%s'", file_path) # Log entry
+        logger.debug("PYMUPDF_AVAILABLE: %s, PYPDF2_AVAILABLE: %s at execution time", PYMUPDF_AVAILABLE, PYPDF2_AVAILABLE) # Log flag status
 
         if not file_path:
             return "Error: File path parameter is required."
+        # Cheap string checks first, so rejected inputs never reach path resolution or the filesystem
+        if os.path.isabs(file_path):
+            logger.warning(f"Absolute path rejected: '{file_path}'.")
+            return "Error: Absolute file paths are not allowed."
+        if _TRAVERSAL_RE.search(file_path):
+            logger.warning(f"Path traversal attempt: '..' in '{file_path}'.")
+            return "Error: Path should not contain '..'."
 
         absolute_filepath = "" # Initialize to handle potential early exit
         try:
-            absolute_filepath = os.path.abspath(os.path.join(FILE_READ_BASE_PATH, file_path))
-            logger.debug(f"Absolute filepath resolved to: {absolute_filepath}")
+            # realpath follows symlinks, so a link pointing outside the base is caught below
+            absolute_filepath = os.path.realpath(os.path.join(_BASE, file_path))
+            logger.debug("Absolute filepath resolved to: %s", absolute_filepath)
 
-            if not absolute_filepath.startswith(os.path.abspath(FILE_READ_BASE_PATH)):
+            # Both sides are realpath-normalized, so a prefix check on the hoisted base (plus separator) is enough:
+            # '/tmp/foobar' does not start with '/tmp/foo/'
+            if not absolute_filepath.startswith(_BASE_PREFIX):
                 logger.warning(f"Access denied: '{absolute_filepath}' is outside base path '{FILE_READ_BASE_PATH}'.")
                 return "Error: Access denied. Path is outside allowed directory."
-            if ".." in file_path:
-                logger.warning(f"Path traversal attempt: '..' in '{file_path}'.")
-                return "Error: Path should not contain '..'."
         except Exception as e:
             logger.error(f"Error processing file_path '{file_path}': {e}", exc_info=True)
             return f"Error processing file_path '{file_path}': {str(e)}"
 
-        if os.path.isabs(file_path):
-            logger.warning(f"Absolute path rejected: '{file_path}'.")
-            return "Error: Absolute file paths are not allowed."
-
         try:
-            if not os.path.exists(absolute_filepath):
+            # One stat() call answers "exists?", "regular file?" and "how big?", and doubles as the cache key
+            try:
+                stat_result = os.stat(absolute_filepath)
+            except OSError as oe:
+                # e.g. 'a.txt/x' (ENOTDIR) or an overlong name (ENAMETOOLONG); anything else (permissions...) propagates
+                if oe.errno not in _NOT_FOUND_ERRNOS:
+                    raise
                 logger.warning(f"File not found at '{absolute_filepath}' (from '{file_path}').")
                 return f"Error: File not found at '{file_path}' (resolved: '{absolute_filepath}')"
-            if not os.path.isfile(absolute_filepath):
+            if not stat.S_ISREG(stat_result.st_mode):
                 logger.warning(f"Path '{absolute_filepath}' is not a file.")
                 return f"Error: Path '{file_path}' is not a file."
 
-            if os.path.getsize(absolute_filepath) > MAX_FILE_SIZE_BYTES:
+            if stat_result.st_size > MAX_FILE_SIZE_BYTES:
                 logger.warning(f"File '{absolute_filepath}' too large.")
                 return f"Error: File '{file_path}' too large (>{MAX_FILE_SIZE_BYTES / (1024*1024):.1f}MB)."
 
             file_extension = os.path.splitext(absolute_filepath)[1].lower()
-            logger.debug(f"Determined file extension: '{file_extension}' for file: {absolute_filepath}")
+            logger.debug("Determined file extension: '%s' for file: %s", file_extension, absolute_filepath)
             content = ""
 
             if file_extension == ".pdf":
                 logger.debug("Attempting PDF processing path.")
-                if not PYPDF2_AVAILABLE:
-                    logger.warning("PyPDF2 not available, returning error for PDF.")
-                    return "Error: Cannot read PDF. PyPDF2 library is not installed. Please install it (e.g., pip install PyPDF2)."
+                if _get_pdf_backend() is None:
+                    logger.warning("Neither PyMuPDF nor PyPDF2 available, returning error for PDF.")
+                    return "Error: Cannot read PDF. No PDF library is installed. Please install one (e.g., pip install pymupdf)."
                 try:
-                    with open(absolute_filepath, 'rb') as f:
-                        reader = PyPDF2.PdfReader(f)
-                        text_parts = []
-                        for page_num in range(len(reader.pages)):
-                            page = reader.pages[page_num]
-                            extracted_text = page.extract_text()
-                            if extracted_text:
-                                text_parts.append(extracted_text)
-                        raw_content = "\n".join(text_parts)
-                        content = _clean_pdf_text(raw_content)
-                    logger.info(f"Successfully extracted and cleaned text from PDF '{file_path}'. Original length: {len(raw_content)}, Cleaned length: {len(content)}")
+                    content = _read_pdf_cached(absolute_filepath, stat_result.st_mtime_ns, stat_result.st_size)
+                    logger.info(f"Successfully read text from PDF '{file_path}'. Cleaned length: {len(content)}")
                     if not content.strip():
                          logger.info(f"No text content extracted or remained after cleaning from PDF '{file_path}'. Might be image-based.")
                          return f"Info: PDF file '{file_path}' was read, but no text content could be extracted or remained after cleaning (it might be an image-based PDF or empty)."
-                except PyPDF2.errors.PdfReadError as pe:
-                     logger.error(f"PyPDF2 PdfReadError for '{file_path}': {pe}", exc_info=True)
+                except _PDF_READ_ERRORS as pe:
+                     logger.error(f"PDF read error for '{file_path}': {pe}", exc_info=True)
                      return f"Error reading PDF '{file_path}': Invalid or corrupted PDF file. Details: {str(pe)}"
                 except Exception as e:
                     logger.error(f"Generic error processing PDF file '{file_path}': {e}", exc_info=True)
                     return f"Error processing PDF file '{file_path}': {str(e)}"
             else: # Assume plain text for other files
-                logger.debug(f"Attempting plain text processing path for '{file_path}'.")
+                logger.debug("Attempting plain text processing path for '%s'.", file_path)
                 try:
-                    with open(absolute_filepath, 'r', encoding='utf-8') as f:
-                        content = f.read(MAX_CHARS_RETURN + 1)
+                    content = _read_text_cached(absolute_filepath, stat_result.st_mtime_ns, stat_result.st_size)
                     logger.info(f"Successfully read text file '{file_path}'. Length: {len(content)}")
+                except _BinaryFileError:
+                    logger.warning(f"Binary content detected in '{file_path}'.")
+                    return f"Error: File '{file_path}' appears to be a binary file and cannot be read as text."
                 except UnicodeDecodeError:
                     logger.warning(f"UnicodeDecodeError for '{file_path}'.")
                     return f"Error: Could not decode file '{file_path}' using UTF-8. It might be a binary file of an unsupported type or use a different encoding."
@@ -155,7 +287,7 @@ class FileReaderTool(BaseTool):
             return content
 
         except FileNotFoundError:
-            # This specific error is less likely now due to the os.path.exists check above,
+            # This specific error is less likely now due to the os.stat check above,
             # but kept for robustness / unexpected scenarios.
             logger.warning(f"FileNotFoundError (unexpected) for '{file_path}'.")
             return f"Error: File not found at '{file_path}'."
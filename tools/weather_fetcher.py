@@ -1,11 +1,33 @@
 import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .base_tool import BaseTool
 from typing import Dict, Any
 import json
+try:
+    import orjson # Faster JSON parsing of API responses; its JSONDecodeError subclasses json.JSONDecodeError
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # Define the API URL directly or get from environment
 WEATHER_API_BASE_URL = os.getenv("WEATHER_API_URL", "http://api.openweathermap.org/data/2.5/weather")
+WEATHER_API_TIMEOUT = (3, 5) # (connect, read) seconds; without a timeout a stalled API would hang the request forever
+WEATHER_MAX_RESPONSE_BYTES = 64 * 1024 # A normal response is well under 1KB; anything past this cap is not downloaded
+WEATHER_CACHE_TTL_SECONDS = 120 # Current conditions barely change within this window, so repeat lookups skip the network
+WEATHER_CACHE_MAX_ENTRIES = 256
+
+# (normalized city, units) -> (time.monotonic() when fetched, formatted report); only successful lookups are cached
+_WEATHER_CACHE = {}
+_WEATHER_CACHE_LOCK = threading.Lock()
+
+# Shared session so repeated lookups reuse the pooled (TLS) connection instead of reconnecting per call
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(max_retries=Retry(total=2, backoff_factor=0.2)))
+_SESSION.mount("https://", HTTPAdapter(max_retries=Retry(total=2, backoff_factor=0.2)))
 
 class WeatherFetcherTool(BaseTool):
     """A tool for fetching current weather information."""
@@ -44,10 +66,26 @@ class WeatherFetcherTool(BaseTool):
             'units': 'metric'
         }
 
+        cache_key = (city.strip().lower(), params['units'])
+        now = time.monotonic()
+        with _WEATHER_CACHE_LOCK:
+            cached = _WEATHER_CACHE.get(cache_key)
+        if cached is not None and now - cached[0] < WEATHER_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        body = b""
         try:
-            response = requests.get(WEATHER_API_BASE_URL, params=params)
+            # Stream the body so at most WEATHER_MAX_RESPONSE_BYTES are ever read into memory; iter_content
+            # (unlike response.raw.read) decompresses gzip and wraps read timeouts as RequestException
+            with _SESSION.get(WEATHER_API_BASE_URL, params=params, timeout=WEATHER_API_TIMEOUT, stream=True) as response:
+                chunks = bytearray()
+                for chunk in response.iter_content(chunk_size=8192):
+                    chunks += chunk
+                    if len(chunks) > WEATHER_MAX_RESPONSE_BYTES:
+                        return f"Error: Weather service response for {city} exceeded {WEATHER_MAX_RESPONSE_BYTES // 1024}KB and was discarded."
+                body = bytes(chunks)
             response.raise_for_status()
-            data = response.json()
+            data = _json_loads(body)
 
             if str(data.get("cod")) != "200":
                 return f"Error fetching weather for {city}: {data.get('message', 'Unknown error from API')}"
@@ -59,22 +97,28 @@ class WeatherFetcherTool(BaseTool):
             humidity = data.get('main', {}).get('humidity', 'N/A')
             wind_speed = data.get('wind', {}).get('speed', 'N/A')
 
-            return (
+            report = (
                 f"Current weather in {data.get('name', city)}:\n"
                 f"- Condition: {main_weather} ({description})\n"
                 f"- Temperature: {temp}°C (Feels like: {feels_like}°C)\n"
                 f"- Humidity: {humidity}%\n"
                 f"- Wind Speed: {wind_speed} m/s"
             )
+            with _WEATHER_CACHE_LOCK:
+                _WEATHER_CACHE.pop(cache_key, None) # Re-insert so dict order stays oldest-fetched first
+                _WEATHER_CACHE[cache_key] = (now, report)
+                if len(_WEATHER_CACHE) > WEATHER_CACHE_MAX_ENTRIES:
+                    del _WEATHER_CACHE[next(iter(_WEATHER_CACHE))] # Evict the oldest entry
+            return report
 
         except requests.exceptions.HTTPError as http_err:
-            error_message = f"HTTP error fetching weather for {city}: {http_err}. Response: {response.text}"
+            error_message = f"HTTP error fetching weather for {city}: {http_err}. Response: {body.decode('utf-8', 'replace')}"
             if response.status_code == 401:
                 error_message += " (This often indicates an invalid or missing API key)"
             return error_message
         except requests.exceptions.RequestException as e:
             return f"Network error connecting to weather service for {city}: {str(e)}"
         except json.JSONDecodeError:
-            return f"Error: Could not parse weather data response for {city}. Raw response: {response.text if 'response' in locals() else 'No response object'}"
+            return f"Error: Could not parse weather data response for {city}. Raw response: {body.decode('utf-8', 'replace')}"
         except Exception as e:
             return f"An unexpected error occurred while fetching weather for {city}: {str(e)}" 
\ No newline at end of file